@@ -12,7 +12,7 @@ __description__ = "Automated web application deployment using AI"
 # Import main components for easier access
 from .main import app
 from .models import BuildRequest, RevisionRequest, EvaluationResponse
-from .llm_client import LLMClient
+from .llm_client import LLMClient, LLMClientLocal, LLMClientRemote, create_llm_client
 from .github_client import GitHubClient
 from .evaluation_client import EvaluationClient
 
@@ -22,6 +22,9 @@ __all__ = [
     'RevisionRequest',
     'EvaluationResponse',
     'LLMClient',
+    'LLMClientLocal',
+    'LLMClientRemote',
+    'create_llm_client',
     'GitHubClient',
     'EvaluationClient'
 ]
\ No newline at end of file
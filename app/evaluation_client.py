@@ -1,54 +1,143 @@
 import aiohttp
+import orjson
 import logging
 import asyncio
-from typing import Optional
+import random
+import time
+from typing import Dict, Optional
+from urllib.parse import urlparse
 from .models import EvaluationResponse
 
 logger = logging.getLogger(__name__)
 
+class CircuitBreaker:
+    """CLOSED -> OPEN -> HALF_OPEN breaker for a single evaluation host"""
+    
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = "CLOSED"
+        self.failure_count = 0
+        self.opened_at = 0.0
+    
+    def allow_request(self) -> bool:
+        """Return whether a request may be sent to the host right now"""
+        if self.state == "CLOSED":
+            return True
+        
+        # OPEN waits out the reset timeout; HALF_OPEN lets a single probe through
+        # and only allows another one if that probe never reported back
+        if time.monotonic() - self.opened_at < self.reset_timeout:
+            return False
+        self.state = "HALF_OPEN"
+        self.opened_at = time.monotonic()
+        return True
+    
+    def record_success(self):
+        self.state = "CLOSED"
+        self.failure_count = 0
+    
+    def record_failure(self):
+        self.failure_count += 1
+        if self.state == "HALF_OPEN" or self.failure_count >= self.failure_threshold:
+            self.state = "OPEN"
+            self.opened_at = time.monotonic()
+
 class EvaluationClient:
     def __init__(self):
         self.session: Optional[aiohttp.ClientSession] = None
+        self.breakers: Dict[str, CircuitBreaker] = {}
+        # Keep connections and DNS lookups alive across retries
+        self.connector_options = {
+            "limit": 100,
+            "limit_per_host": 20,
+            "keepalive_timeout": 30,
+            "ttl_dns_cache": 300,
+            "enable_cleanup_closed": True
+        }
+        self.timeout = aiohttp.ClientTimeout(total=30, connect=10)
     
     async def get_session(self) -> aiohttp.ClientSession:
         """Get or create aiohttp session"""
         if self.session is None or self.session.closed:
-            self.session = aiohttp.ClientSession()
+            # The connector is owned by the session, so it is created alongside it
+            connector = aiohttp.TCPConnector(**self.connector_options)
+            self.session = aiohttp.ClientSession(
+                connector=connector,
+                timeout=self.timeout
+            )
         return self.session
     
     async def submit_evaluation(self, eval_data: EvaluationResponse, evaluation_url: str) -> bool:
         """Submit evaluation data to evaluation service with retry logic"""
         max_retries = 5
         base_delay = 1  # seconds
+        max_retry_after = 60  # seconds; longer server-requested waits are not honored
+        
+        host = urlparse(evaluation_url).netloc
+        breaker = self.breakers.setdefault(host, CircuitBreaker())
         
         for attempt in range(max_retries):
+            if not breaker.allow_request():
+                logger.warning(f"Circuit open for {host}, skipping evaluation submission for {eval_data.task}")
+                return False
+            
+            retry_after = 0.0
             try:
                 session = await self.get_session()
                 
                 async with session.post(
                     evaluation_url,
-                    json=eval_data.dict(),
+                    data=orjson.dumps(eval_data.dict(exclude_none=True)),
                     headers={'Content-Type': 'application/json'}
                 ) as response:
                     
                     if response.status == 200:
+                        breaker.record_success()
                         logger.info(f"Successfully submitted evaluation for {eval_data.task}")
                         return True
+                    elif response.status == 429 or response.status >= 500:
+                        # Only overload and server errors say something about the host's health
+                        breaker.record_failure()
+                        logger.warning(f"Evaluation submission failed with status {response.status}")
+                        if response.status in (429, 503):
+                            retry_after = self._parse_retry_after(response.headers.get('Retry-After'))
+                    elif 400 <= response.status < 500:
+                        # The host is up but rejected this payload; retrying will not help
+                        breaker.record_success()
+                        logger.error(f"Evaluation service rejected {eval_data.task} with status {response.status}")
+                        return False
                     else:
                         logger.warning(f"Evaluation submission failed with status {response.status}")
                         
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                breaker.record_failure()
+                logger.warning(f"Evaluation submission attempt {attempt + 1} failed: {str(e)}")
             except Exception as e:
                 logger.warning(f"Evaluation submission attempt {attempt + 1} failed: {str(e)}")
             
-            # Exponential backoff
+            if retry_after > max_retry_after:
+                logger.error(f"Evaluation service asked to retry in {retry_after:.0f} seconds, giving up on {eval_data.task}")
+                return False
+            
+            # Exponential backoff with full jitter, honoring Retry-After
             if attempt < max_retries - 1:
-                delay = base_delay * (2 ** attempt)
-                logger.info(f"Retrying in {delay} seconds...")
+                delay = random.uniform(0, base_delay * (2 ** attempt))
+                delay = max(delay, retry_after)
+                logger.info(f"Retrying in {delay:.2f} seconds...")
                 await asyncio.sleep(delay)
         
         logger.error(f"Failed to submit evaluation after {max_retries} attempts")
         return False
     
+    @staticmethod
+    def _parse_retry_after(value: Optional[str]) -> float:
+        """Parse a Retry-After header given in seconds (HTTP dates are ignored)"""
+        try:
+            return max(float(value), 0.0)
+        except (TypeError, ValueError):
+            return 0.0
+    
     async def close(self):
         """Close the aiohttp session"""
         if self.session and not self.session.closed:
@@ -1,7 +1,8 @@
 import os
 import base64
+import asyncio
 import logging
-from github import Github, GithubException
+from github import Github, GithubException, InputGitTreeElement
 import tempfile
 import shutil
 import subprocess
@@ -18,74 +19,82 @@ class GitHubClient:
         self.github = Github(self.token)
         self.user = self.github.get_user()
     
-    async def create_repository(self, name: str, code: dict, description: str = "") -> Tuple[str, str]:
-        """Create a new repository with generated code"""
+    async def _run(self, fn, *args, **kwargs):
+        """Run a blocking PyGithub call in a worker thread"""
+        return await asyncio.to_thread(fn, *args, **kwargs)
+    
+    async def _login(self) -> str:
+        """Get the authenticated user's login (fetched lazily by PyGithub)"""
+        return await self._run(getattr, self.user, "login")
+    
+    async def _commit_files(self, repo, code: dict, message: str) -> str:
+        """Commit all files on top of the default branch as a single commit and return its SHA"""
+        # auto_init names the first branch after the account's default-branch setting
+        branch_name = repo.default_branch
+        # Blob uploads and the branch/ref lookups are independent, so run them together
+        branch, ref, *blobs = await asyncio.gather(
+            self._run(repo.get_branch, branch_name),
+            self._run(repo.get_git_ref, f"heads/{branch_name}"),
+            *(self._run(repo.create_git_blob, content, "utf-8") for content in code.values())
+        )
+        elements = [
+            InputGitTreeElement(path=filename, mode="100644", type="blob", sha=blob.sha)
+            for filename, blob in zip(code, blobs)
+        ]
+        
+        parent = branch.commit.commit
+        tree = await self._run(repo.create_git_tree, elements, base_tree=parent.tree)
+        commit = await self._run(repo.create_git_commit, message, tree, [parent])
+        await self._run(ref.edit, commit.sha)
+        return commit.sha
+    
+    async def create_repository(self, name: str, code: dict, description: str = "") -> Tuple[str, str, str]:
+        """Create a new repository with generated code, returning repo URL, Pages URL and commit SHA"""
         try:
-            # Create repository
-            repo = self.user.create_repo(
+            # Create repository (the Git data API rejects empty repositories)
+            repo = await self._run(
+                self.user.create_repo,
                 name=name,
                 description=description,
-                auto_init=False,
+                auto_init=True,
                 private=False
             )
             
-            # Create files
-            for filename, content in code.items():
-                repo.create_file(
-                    filename,
-                    f"Add {filename}",
-                    content,
-                    branch="main"
-                )
+            # Commit all files at once
+            commit_sha = await self._commit_files(repo, code, "Add generated application")
             
             # Enable GitHub Pages
-            repo.edit(has_pages=True)
-            repo.create_pages_site(branch="main", path="/")
+            await self._run(repo.edit, has_pages=True)
+            await self._run(repo.create_pages_site, branch=repo.default_branch, path="/")
             
             repo_url = repo.html_url
-            pages_url = f"https://{self.user.login}.github.io/{name}"
+            login = await self._login()
+            pages_url = f"https://{login}.github.io/{name}"
             
             logger.info(f"Created repository: {repo_url}")
             logger.info(f"Pages URL: {pages_url}")
             
-            return repo_url, pages_url
+            return repo_url, pages_url, commit_sha
             
         except GithubException as e:
             logger.error(f"GitHub error: {str(e)}")
             raise
     
-    async def update_repository(self, name: str, code: dict) -> Tuple[str, str]:
-        """Update existing repository with new code"""
+    async def update_repository(self, name: str, code: dict) -> Tuple[str, str, str]:
+        """Update existing repository with new code, returning repo URL, Pages URL and commit SHA"""
         try:
-            repo = self.github.get_repo(f"{self.user.login}/{name}")
+            login = await self._login()
+            repo = await self._run(self.github.get_repo, f"{login}/{name}")
             
-            # Update files
-            for filename, content in code.items():
-                try:
-                    # Try to get existing file to update
-                    file_contents = repo.get_contents(filename, ref="main")
-                    repo.update_file(
-                        filename,
-                        f"Update {filename}",
-                        content,
-                        file_contents.sha,
-                        branch="main"
-                    )
-                except:
-                    # File doesn't exist, create it
-                    repo.create_file(
-                        filename,
-                        f"Add {filename}",
-                        content,
-                        branch="main"
-                    )
+            # Commit all updated files at once, keeping files not in code
+            commit_sha = await self._commit_files(repo, code, "Update generated application")
             
             repo_url = repo.html_url
-            pages_url = f"https://{self.user.login}.github.io/{name}"
+            pages_url = f"https://{login}.github.io/{name}"
             
             logger.info(f"Updated repository: {repo_url}")
             
-            return repo_url, pages_url
+            return repo_url, pages_url, commit_sha
             
         except GithubException as e:
             logger.error(f"GitHub update error: {str(e)}")
@@ -94,8 +103,9 @@ class GitHubClient:
     async def get_latest_commit(self, repo_name: str) -> str:
         """Get the latest commit SHA for a repository"""
         try:
-            repo = self.github.get_repo(f"{self.user.login}/{repo_name}")
-            branch = repo.get_branch("main")
+            login = await self._login()
+            repo = await self._run(self.github.get_repo, f"{login}/{repo_name}")
+            branch = await self._run(repo.get_branch, repo.default_branch)
             return branch.commit.sha
         except GithubException as e:
             logger.error(f"Error getting commit SHA: {str(e)}")
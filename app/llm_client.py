@@ -1,57 +1,123 @@
 import os
-import json
+import re
+import orjson
+import asyncio
 import logging
-from typing import List, Dict, Any, Optional
-from transformers import pipeline, AutoTokenizer, AutoModelForCausalLM
+import aiohttp
+from abc import ABC, abstractmethod
+from typing import List, Dict, Any, Optional, Callable, Awaitable
+from transformers import (
+    AutoTokenizer,
+    AutoModelForCausalLM,
+    BitsAndBytesConfig,
+    StoppingCriteria,
+    StoppingCriteriaList
+)
 import torch
 
 logger = logging.getLogger(__name__)
 
-class LLMClient:
-    def __init__(self):
-        self.model_name = "codellama/CodeLlama-7b-hf"  # You can change this model
-        self.tokenizer = None
-        self.model = None
-        self.generator = None
-        self._initialize_model()
+# Static parts of the prompt, tokenized once when the model loads. All fixed
+# instructions sit ahead of the brief so the cached prefix KV covers them.
+PROMPT_PREFIX = """
+        Create a complete web application based on the brief below.
+        
+        Generate the following files in JSON format:
+        {
+            "README.md": "Complete README with setup instructions",
+            "index.html": "Main HTML file",
+            "style.css": "CSS styles",
+            "script.js": "JavaScript functionality",
+            "LICENSE": "MIT License content"
+        }
+        
+        Ensure the code is:
+        - Complete and runnable
+        - Well-documented
+        - Follows best practices
+        - Meets all requirements listed below
+        
+        BRIEF: """
+
+PROMPT_SUFFIX = """
+        
+        Return only valid JSON:
+        """
+
+# Briefs and checks the template files already satisfy, so the LLM adds nothing.
+# Both are matched in full so any extra requirement sends the request to the LLM.
+TEMPLATE_BRIEF_PATTERN = re.compile(
+    r"(?:(?:create|build|make|generate)\s+)?(?:an?\s+)?"
+    r"(?:simple|basic|blank|empty|minimal|placeholder|hello[\s-]world)\s+"
+    r"(?:(?:static|web|landing|html)\s+)?(?:page|site|website|web app|app)[.!]?",
+    re.IGNORECASE
+)
+TEMPLATE_CHECK_PATTERN = re.compile(
+    r"(?:(?:the\s+)?(?:repo|repository)\s+has\s+(?:an?\s+)?MIT\s+license"
+    r"|LICENSE(?:\s+file)?\s+(?:exists|is\s+MIT)"
+    r"|README(?:\.md)?\s+(?:exists|is\s+present)"
+    r"|index\.html\s+exists"
+    r"|(?:the\s+)?page\s+loads(?:\s+without\s+(?:console\s+)?errors)?"
+    r")[.]?",
+    re.IGNORECASE
+)
+
+class StopOnSubstring(StoppingCriteria):
+    """Stop generation once every sequence has emitted `stop` after its JSON opened"""
     
-    def _initialize_model(self):
-        """Initialize the Hugging Face model"""
-        try:
-            # Use smaller model for demo, adjust based on your needs
-            self.model_name = "microsoft/DialoGPT-medium"
-            self.generator = pipeline(
-                "text-generation",
-                model=self.model_name,
-                torch_dtype=torch.float16,
-                device_map="auto",
-                max_length=1024
-            )
-            logger.info(f"Initialized model: {self.model_name}")
-        except Exception as e:
-            logger.error(f"Model initialization failed: {str(e)}")
-            # Fallback to a simpler approach
-            self.generator = None
+    def __init__(self, tokenizer, stop: str, prompt_length: int, batch_size: int, window: int = 8):
+        self.tokenizer = tokenizer
+        self.stop = stop
+        self.prompt_length = prompt_length
+        self.window = window
+        self.done_token_ids = {tokenizer.eos_token_id, tokenizer.pad_token_id}
+        # Per-row state so each step only decodes the newest few tokens
+        self.stopped = [False] * batch_size
+        self.json_start: List[Optional[int]] = [None] * batch_size
+    
+    def __call__(self, input_ids: torch.LongTensor, scores: torch.FloatTensor, **kwargs) -> bool:
+        length = input_ids.shape[1]
+        for i, row in enumerate(input_ids):
+            if self.stopped[i]:
+                continue
+            # Sequences that already hit EOS are padded until the batch finishes
+            if row[-1].item() in self.done_token_ids:
+                self.stopped[i] = True
+                continue
+            
+            if self.json_start[i] is None:
+                if '{' not in self.tokenizer.decode(row[-1:], skip_special_tokens=True):
+                    continue
+                self.json_start[i] = length - 1
+            
+            window_start = max(self.json_start[i], length - self.window, self.prompt_length)
+            text = self.tokenizer.decode(row[window_start:], skip_special_tokens=True)
+            if window_start == self.json_start[i]:
+                # Ignore anything in the opening token before the brace (e.g. a fence)
+                text = text[text.find('{'):]
+            if self.stop in text:
+                self.stopped[i] = True
+        return all(self.stopped)
+
+class LLMClient(ABC):
+    """Prompt construction and output parsing shared by the LLM backends"""
+    
+    def __init__(self):
+        # Closing code fence after the JSON body; raw newlines cannot occur inside JSON strings
+        self.stop_sequence = "```\n"
     
     async def generate_app_code(self, brief: str, checks: List[str], 
                               attachments: List[str] = None,
                               existing_repo: str = None) -> Dict[str, str]:
         """Generate application code based on brief and checks"""
         
-        prompt = self._build_prompt(brief, checks, attachments, existing_repo)
+        if self._is_template_satisfiable(brief, checks, attachments, existing_repo):
+            logger.info("Brief is covered by the templates, skipping LLM generation")
+            return self._generate_template_code_dict(brief)
         
         try:
-            if self.generator:
-                # Use Hugging Face pipeline
-                result = self.generator(
-                    prompt,
-                    max_new_tokens=1024,
-                    temperature=0.7,
-                    do_sample=True,
-                    pad_token_id=50256
-                )
-                generated_text = result[0]['generated_text']
-            else:
+            generated_text = await self._complete(brief, checks, attachments, existing_repo)
+            if generated_text is None:
                 # Fallback: return template code
                 generated_text = self._generate_template_code(brief, checks)
             
@@ -63,40 +129,49 @@ class LLMClient:
             logger.error(f"Code generation failed: {str(e)}")
             return self._generate_fallback_code(brief, checks)
     
+    @abstractmethod
+    async def _complete(self, brief: str, checks: List[str], 
+                        attachments: List[str] = None,
+                        existing_repo: str = None) -> Optional[str]:
+        """Return the raw model completion, or None when no model is available"""
+    
+    def _is_template_satisfiable(self, brief: str, checks: List[str], 
+                                 attachments: List[str] = None,
+                                 existing_repo: str = None) -> bool:
+        """Check whether the template files alone meet the brief and every check"""
+        # Revisions and attachments always carry context the templates cannot reflect
+        if existing_repo or attachments or not checks:
+            return False
+        if TEMPLATE_BRIEF_PATTERN.fullmatch(brief.strip()) is None:
+            return False
+        return all(TEMPLATE_CHECK_PATTERN.fullmatch(check.strip()) for check in checks)
+    
     def _build_prompt(self, brief: str, checks: List[str], 
                      attachments: List[str] = None,
                      existing_repo: str = None) -> str:
         """Build prompt for code generation"""
+        body = self._build_prompt_body(brief, checks, attachments, existing_repo)
+        return PROMPT_PREFIX + body + PROMPT_SUFFIX
+    
+    def _build_prompt_body(self, brief: str, checks: List[str], 
+                          attachments: List[str] = None,
+                          existing_repo: str = None) -> str:
+        """Build the request-specific part of the prompt"""
         
-        prompt = f"""
-        Create a complete web application based on this brief:
-        
-        BRIEF: {brief}
+        return f"""{brief}
         
         REQUIREMENTS:
         {chr(10).join(f"- {check}" for check in checks)}
         
-        {"EXISTING REPOSITORY: " + existing_repo if existing_repo else "NEW APPLICATION"}
-        
-        Generate the following files in JSON format:
-        {{
-            "README.md": "Complete README with setup instructions",
-            "index.html": "Main HTML file",
-            "style.css": "CSS styles",
-            "script.js": "JavaScript functionality",
-            "LICENSE": "MIT License content"
-        }}
-        
-        Ensure the code is:
-        - Complete and runnable
-        - Well-documented
-        - Follows best practices
-        - Meets all requirements
-        
-        Return only valid JSON:
-        """
-        
-        return prompt
+        {"EXISTING REPOSITORY: " + existing_repo if existing_repo else "NEW APPLICATION"}"""
+    
+    def _trim_completion(self, text: str) -> str:
+        """Drop tokens sampled after the stop sequence while the rest of the batch finished"""
+        json_start = text.find('{')
+        if json_start == -1:
+            return text
+        stop_at = text.find(self.stop_sequence, json_start)
+        return text[:stop_at] if stop_at != -1 else text
     
     def _parse_generated_code(self, generated_text: str, brief: str) -> Dict[str, str]:
         """Parse generated text into code files"""
@@ -106,7 +181,7 @@ class LLMClient:
             json_end = generated_text.rfind('}') + 1
             json_str = generated_text[json_start:json_end]
             
-            code_files = json.loads(json_str)
+            code_files = orjson.loads(json_str)
         except:
             # Fallback if JSON parsing fails
             code_files = self._generate_template_code_dict(brief)
@@ -121,7 +196,7 @@ class LLMClient:
     
     def _generate_template_code(self, brief: str, checks: List[str]) -> str:
         """Generate template code as fallback"""
-        return json.dumps(self._generate_template_code_dict(brief))
+        return orjson.dumps(self._generate_template_code_dict(brief)).decode()
     
     def _generate_template_code_dict(self, brief: str) -> Dict[str, str]:
         """Generate template code files"""
@@ -237,4 +312,246 @@ OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
 SOFTWARE."""
         }
         
-        return templates.get(filename, f"# {filename}\n\nContent for {filename}")
\ No newline at end of file
+        return templates.get(filename, f"# {filename}\n\nContent for {filename}")
+
+class LLMClientLocal(LLMClient):
+    """Runs the Hugging Face model inside this process"""
+    
+    def __init__(self):
+        super().__init__()
+        self.model_name = "codellama/CodeLlama-7b-hf"  # You can change this model
+        self.tokenizer = None
+        self.model = None
+        self.generator = None
+        self._prefix_ids: List[int] = []
+        self._suffix_ids: List[int] = []
+        # Model is loaded lazily on first generation so startup stays cheap
+        self._model_loaded = False
+        self._init_lock = asyncio.Lock()
+        # Concurrent prompts are merged into a single generate() call
+        self.max_batch_size = 8
+        self.max_wait_ms = 50
+        self._queue: asyncio.Queue = asyncio.Queue()
+        self._batch_task: Optional[asyncio.Task] = None
+        # KV cache of PROMPT_PREFIX, shared by every generation
+        self._prefix_past_key_values = None
+        self.generation_kwargs = {
+            "max_new_tokens": 1024,
+            "min_new_tokens": 64,
+            "temperature": 0.7,
+            "do_sample": True
+        }
+    
+    async def _ensure_model(self):
+        """Load the model on first use without blocking the event loop"""
+        async with self._init_lock:
+            if not self._model_loaded:
+                loop = asyncio.get_running_loop()
+                await loop.run_in_executor(None, self._initialize_model)
+                self._model_loaded = True
+    
+    def _initialize_model(self):
+        """Initialize the Hugging Face model"""
+        try:
+            # Use smaller model for demo, adjust based on your needs
+            self.model_name = "microsoft/DialoGPT-medium"
+            self.tokenizer = AutoTokenizer.from_pretrained(self.model_name, use_fast=True)
+            # Decoder-only models often ship without a pad token; pad with EOS on the left
+            if self.tokenizer.pad_token is None:
+                self.tokenizer.pad_token = self.tokenizer.eos_token
+            self.tokenizer.padding_side = "left"
+            self.generation_kwargs["pad_token_id"] = self.tokenizer.pad_token_id
+            self._prefix_ids = self.tokenizer(PROMPT_PREFIX).input_ids
+            self._suffix_ids = self.tokenizer(PROMPT_SUFFIX, add_special_tokens=False).input_ids
+            self.model = AutoModelForCausalLM.from_pretrained(
+                self.model_name,
+                **self._model_load_kwargs()
+            )
+            self.model.eval()
+            self._prefix_past_key_values = self._prefill_prefix()
+            self.generator = self._generate_batch
+            logger.info(f"Initialized model: {self.model_name}")
+        except Exception as e:
+            logger.error(f"Model initialization failed: {str(e)}")
+            # Fallback to a simpler approach
+            self.tokenizer = None
+            self.model = None
+            self._prefix_past_key_values = None
+            self.generator = None
+    
+    def _model_load_kwargs(self) -> Dict[str, Any]:
+        """Pick weight precision for the available hardware"""
+        if torch.cuda.is_available():
+            # INT8 weight-only quantization halves memory bandwidth on GPU
+            return {
+                "quantization_config": BitsAndBytesConfig(load_in_8bit=True),
+                "device_map": "auto"
+            }
+        
+        # FP16 matmuls are slow on CPU; use BF16 only where it is native
+        supports_bf16 = getattr(torch.cpu, "_is_cpu_support_avx512_bf16", None)
+        if supports_bf16 is not None and supports_bf16():
+            return {"torch_dtype": torch.bfloat16}
+        return {"torch_dtype": torch.float32}
+    
+    def _prefill_prefix(self):
+        """Run the static prompt prefix through the model once and keep its KV cache"""
+        if not self._prefix_ids:
+            return None
+        with torch.inference_mode():
+            output = self.model(
+                input_ids=torch.tensor([self._prefix_ids], device=self.model.device),
+                use_cache=True
+            )
+        return output.past_key_values
+    
+    def _expand_prefix_past_key_values(self, batch_size: int):
+        """Broadcast the cached prefix KV to the batch size without copying"""
+        return tuple(
+            tuple(tensor.expand(batch_size, *tensor.shape[1:]) for tensor in layer)
+            for layer in self._prefix_past_key_values
+        )
+    
+    def _generate_batch(self, tails: List[List[int]]) -> List[str]:
+        """Run one generate() call over the shared prefix plus each prompt tail"""
+        # Rows are prefix + padding + tail so the cached prefix KV lines up for every
+        # row; the attention mask hides the padding and position ids skip over it
+        prefix_ids = self._prefix_ids
+        width = max(len(ids) for ids in tails)
+        pad_id = self.generation_kwargs["pad_token_id"]
+        
+        input_ids = torch.tensor(
+            [prefix_ids + [pad_id] * (width - len(ids)) + ids for ids in tails],
+            device=self.model.device
+        )
+        attention_mask = torch.tensor(
+            [[1] * len(prefix_ids) + [0] * (width - len(ids)) + [1] * len(ids) for ids in tails],
+            device=self.model.device
+        )
+        
+        cache_kwargs = {}
+        if self._prefix_past_key_values is not None:
+            cache_kwargs["past_key_values"] = self._expand_prefix_past_key_values(len(tails))
+        
+        prompt_length = len(prefix_ids) + width
+        stopping_criteria = StoppingCriteriaList([
+            StopOnSubstring(self.tokenizer, self.stop_sequence, prompt_length, len(tails))
+        ])
+        
+        with torch.inference_mode():
+            output = self.model.generate(
+                input_ids=input_ids,
+                attention_mask=attention_mask,
+                use_cache=True,
+                return_dict_in_generate=True,
+                stopping_criteria=stopping_criteria,
+                **cache_kwargs,
+                **self.generation_kwargs
+            )
+        return [
+            self._trim_completion(self.tokenizer.decode(row[prompt_length:], skip_special_tokens=True))
+            for row in output.sequences
+        ]
+    
+    async def _batch_worker(self):
+        """Drain queued prompt tails into batches of up to max_batch_size"""
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self._queue.get()]
+            deadline = loop.time() + self.max_wait_ms / 1000
+            while len(batch) < self.max_batch_size:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+            
+            tails = [tail_ids for tail_ids, _ in batch]
+            try:
+                texts = await loop.run_in_executor(None, self.generator, tails)
+            except Exception as e:
+                logger.error(f"Batch generation failed: {str(e)}")
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+            
+            logger.info(f"Generated batch of {len(batch)} prompts")
+            for (_, future), text in zip(batch, texts):
+                if not future.done():
+                    future.set_result(text)
+    
+    async def _submit(self, tail_ids: List[int]) -> str:
+        """Queue prompt tail ids for batched generation and wait for the completion"""
+        if self._batch_task is None or self._batch_task.done():
+            self._batch_task = asyncio.create_task(self._batch_worker())
+        
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((tail_ids, future))
+        return await future
+    
+    async def _complete(self, brief: str, checks: List[str], 
+                        attachments: List[str] = None,
+                        existing_repo: str = None) -> Optional[str]:
+        """Generate with the in-process model, batched with concurrent requests"""
+        await self._ensure_model()
+        if not self.generator:
+            return None
+        
+        tail_ids = self._encode_prompt_tail(brief, checks, attachments, existing_repo)
+        return await self._submit(tail_ids)
+    
+    def _encode_prompt_tail(self, brief: str, checks: List[str], 
+                           attachments: List[str] = None,
+                           existing_repo: str = None) -> List[int]:
+        """Tokenize everything after the static prefix, reusing the cached suffix ids"""
+        body = self._build_prompt_body(brief, checks, attachments, existing_repo)
+        body_ids = self.tokenizer(body, add_special_tokens=False).input_ids
+        return body_ids + self._suffix_ids
+
+class LLMClientRemote(LLMClient):
+    """Sends prompts to a shared OpenAI-compatible inference server such as vLLM"""
+    
+    def __init__(self, session_provider: Callable[[], Awaitable[aiohttp.ClientSession]]):
+        super().__init__()
+        self.base_url = os.getenv('LLM_REMOTE_URL', 'http://localhost:8001').rstrip('/')
+        self.model_name = os.getenv('LLM_REMOTE_MODEL', 'codellama/CodeLlama-7b-hf')
+        self.get_session = session_provider
+        # Generation takes far longer than the shared session's default timeout
+        self.timeout = aiohttp.ClientTimeout(total=300)
+        self.max_tokens = 1024
+        self.temperature = 0.7
+    
+    async def _complete(self, brief: str, checks: List[str], 
+                        attachments: List[str] = None,
+                        existing_repo: str = None) -> Optional[str]:
+        """Request a completion from the inference server"""
+        payload = {
+            "model": self.model_name,
+            "prompt": self._build_prompt(brief, checks, attachments, existing_repo),
+            "max_tokens": self.max_tokens,
+            "temperature": self.temperature
+        }
+        
+        session = await self.get_session()
+        async with session.post(
+            f"{self.base_url}/v1/completions",
+            data=orjson.dumps(payload),
+            headers={'Content-Type': 'application/json'},
+            timeout=self.timeout
+        ) as response:
+            response.raise_for_status()
+            result = orjson.loads(await response.read())
+        
+        return self._trim_completion(result["choices"][0]["text"])
+
+def create_llm_client(session_provider: Callable[[], Awaitable[aiohttp.ClientSession]]) -> LLMClient:
+    """Create the LLM client selected by the LLM_BACKEND environment variable"""
+    backend = os.getenv('LLM_BACKEND', 'local').lower()
+    if backend == 'remote':
+        return LLMClientRemote(session_provider)
+    if backend != 'local':
+        raise ValueError(f"Unknown LLM_BACKEND: {backend}")
+    return LLMClientLocal()
\ No newline at end of file
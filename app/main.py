@@ -1,14 +1,16 @@
 from fastapi import FastAPI, HTTPException, BackgroundTasks
-from fastapi.responses import JSONResponse
+from fastapi.responses import ORJSONResponse
 from pydantic import BaseModel
 import asyncio
 import os
 from typing import List, Optional, Dict, Any
 import uuid
 import logging
+import orjson
+import redis.asyncio as redis
 
 from .models import BuildRequest, EvaluationResponse, RevisionRequest
-from .llm_client import LLMClient
+from .llm_client import create_llm_client
 from .github_client import GitHubClient
 from .evaluation_client import EvaluationClient
 from .utils import verify_secret, save_attachments
@@ -17,15 +19,37 @@ from .utils import verify_secret, save_attachments
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-app = FastAPI(title="LLM Code Deployment", version="1.0.0")
+app = FastAPI(
+    title="LLM Code Deployment",
+    version="1.0.0",
+    default_response_class=ORJSONResponse
+)
 
-# Initialize clients
-llm_client = LLMClient()
+# Initialize clients (a remote LLM backend shares the evaluation client's connection pool)
 github_client = GitHubClient()
 evaluation_client = EvaluationClient()
+llm_client = create_llm_client(evaluation_client.get_session)
 
-# In-memory storage (replace with Redis in production)
-task_store = {}
+# Task status is kept in Redis so every worker sees the same state
+REDIS_URL = os.getenv('REDIS_URL', 'redis://localhost:6379/0')
+TASK_TTL = 86400  # seconds
+redis_pool = redis.ConnectionPool.from_url(REDIS_URL, max_connections=20)
+redis_client = redis.Redis(connection_pool=redis_pool)
+
+async def save_task(task_id: str, task: Dict[str, Any]):
+    """Store task data with an expiry"""
+    await redis_client.set(f"task:{task_id}", orjson.dumps(task), ex=TASK_TTL)
+
+async def load_task(task_id: str) -> Optional[Dict[str, Any]]:
+    """Load task data, or None if it does not exist or has expired"""
+    raw = await redis_client.get(f"task:{task_id}")
+    return orjson.loads(raw) if raw is not None else None
+
+async def update_task_status(task_id: str, status: str):
+    """Update the status of a stored task"""
+    task = await load_task(task_id) or {}
+    task["status"] = status
+    await save_task(task_id, task)
 
 class HealthResponse(BaseModel):
     status: str
@@ -44,20 +68,20 @@ async def deploy_app(request: BuildRequest, background_tasks: BackgroundTasks):
     """Handle initial app deployment request"""
     try:
         # Verify secret
-        if not verify_secret(request.email, request.secret):
+        if not await verify_secret(request.email, request.secret):
             raise HTTPException(status_code=401, detail="Invalid secret")
         
-        # Store task in memory
+        # Store task
         task_id = f"{request.task}-{request.round}"
-        task_store[task_id] = {
-            "request": request.dict(),
+        await save_task(task_id, {
+            "request": request.dict(exclude={"secret"}),
             "status": "processing"
-        }
+        })
         
         # Process in background
         background_tasks.add_task(process_build_request, request)
         
-        return JSONResponse(
+        return ORJSONResponse(
             status_code=200,
             content={"status": "accepted", "task_id": task_id}
         )
@@ -71,25 +95,25 @@ async def revise_app(request: RevisionRequest, background_tasks: BackgroundTasks
     """Handle app revision request"""
     try:
         # Verify secret
-        if not verify_secret(request.email, request.secret):
+        if not await verify_secret(request.email, request.secret):
             raise HTTPException(status_code=401, detail="Invalid secret")
         
         # Check if round 1 exists
         round1_task_id = f"{request.task}-1"
-        if round1_task_id not in task_store:
+        if await load_task(round1_task_id) is None:
             raise HTTPException(status_code=404, detail="Original task not found")
         
         # Store revision task
         task_id = f"{request.task}-{request.round}"
-        task_store[task_id] = {
-            "request": request.dict(),
+        await save_task(task_id, {
+            "request": request.dict(exclude={"secret"}),
             "status": "processing"
-        }
+        })
         
         # Process in background
         background_tasks.add_task(process_revision_request, request)
         
-        return JSONResponse(
+        return ORJSONResponse(
             status_code=200,
             content={"status": "accepted", "task_id": task_id}
         )
@@ -102,7 +126,7 @@ async def process_build_request(request: BuildRequest):
     """Process build request asynchronously"""
     try:
         # Save attachments
-        attachment_paths = save_attachments(request.attachments)
+        attachment_paths = await save_attachments(request.attachments)
         
         # Generate code using LLM
         logger.info(f"Generating code for task: {request.task}")
@@ -114,15 +138,12 @@ async def process_build_request(request: BuildRequest):
         
         # Create GitHub repository
         repo_name = f"{request.task}-{uuid.uuid4().hex[:8]}"
-        repo_url, pages_url = await github_client.create_repository(
+        repo_url, pages_url, commit_sha = await github_client.create_repository(
             name=repo_name,
             code=generated_code,
             description=f"Generated app for: {request.brief[:100]}..."
         )
         
-        # Get commit SHA
-        commit_sha = await github_client.get_latest_commit(repo_name)
-        
         # Notify evaluation service
         eval_response = EvaluationResponse(
             email=request.email,
@@ -139,14 +160,14 @@ async def process_build_request(request: BuildRequest):
         )
         
         if success:
-            task_store[f"{request.task}-{request.round}"]["status"] = "completed"
+            await update_task_status(f"{request.task}-{request.round}", "completed")
             logger.info(f"Successfully processed task: {request.task}")
         else:
-            task_store[f"{request.task}-{request.round}"]["status"] = "evaluation_failed"
+            await update_task_status(f"{request.task}-{request.round}", "evaluation_failed")
             logger.error(f"Evaluation submission failed for task: {request.task}")
             
     except Exception as e:
-        task_store[f"{request.task}-{request.round}"]["status"] = "failed"
+        await update_task_status(f"{request.task}-{request.round}", "failed")
         logger.error(f"Process build error: {str(e)}")
 
 async def process_revision_request(request: RevisionRequest):
@@ -154,7 +175,7 @@ async def process_revision_request(request: RevisionRequest):
     try:
         # Get original repo info
         round1_task_id = f"{request.task}-1"
-        original_request = task_store[round1_task_id]["request"]
+        original_request = (await load_task(round1_task_id))["request"]
         repo_name = original_request.get("repo_name")
         
         if not repo_name:
@@ -165,19 +186,16 @@ async def process_revision_request(request: RevisionRequest):
         updated_code = await llm_client.generate_app_code(
             brief=request.brief,
             checks=request.checks,
-            attachments=save_attachments(request.attachments),
+            attachments=await save_attachments(request.attachments),
             existing_repo=repo_name
         )
         
         # Update GitHub repository
-        repo_url, pages_url = await github_client.update_repository(
+        repo_url, pages_url, commit_sha = await github_client.update_repository(
             name=repo_name,
             code=updated_code
         )
         
-        # Get commit SHA
-        commit_sha = await github_client.get_latest_commit(repo_name)
-        
         # Notify evaluation service
         eval_response = EvaluationResponse(
             email=request.email,
@@ -194,23 +212,24 @@ async def process_revision_request(request: RevisionRequest):
         )
         
         if success:
-            task_store[f"{request.task}-{request.round}"]["status"] = "completed"
+            await update_task_status(f"{request.task}-{request.round}", "completed")
             logger.info(f"Successfully processed revision: {request.task}")
         else:
-            task_store[f"{request.task}-{request.round}"]["status"] = "evaluation_failed"
+            await update_task_status(f"{request.task}-{request.round}", "evaluation_failed")
             
     except Exception as e:
-        task_store[f"{request.task}-{request.round}"]["status"] = "failed"
+        await update_task_status(f"{request.task}-{request.round}", "failed")
         logger.error(f"Process revision error: {str(e)}")
 
 @app.get("/api/status/{task_id}")
 async def get_task_status(task_id: str):
     """Get status of a task"""
-    if task_id not in task_store:
+    task = await load_task(task_id)
+    if task is None:
         raise HTTPException(status_code=404, detail="Task not found")
     
     return {
         "task_id": task_id,
-        "status": task_store[task_id]["status"],
-        "request": task_store[task_id].get("request", {})
+        "status": task["status"],
+        "request": task.get("request", {})
     }
\ No newline at end of file
@@ -1,7 +1,12 @@
 import os
-import base64
+import re
+import asyncio
+import binascii
+import bcrypt
 import uuid
-import tempfile
+import xxhash
+import aiofiles
+import aiofiles.tempfile
 from typing import List, Dict, Any
 from .models import Attachment
 import logging
@@ -9,51 +14,83 @@ import logging
 logger = logging.getLogger(__name__)
 
 # In production, use a proper database
+# Maps email to a bcrypt hash of the secret, never the secret itself
 SECRET_STORE = {}
+BCRYPT_ROUNDS = 12
 
-def verify_secret(email: str, secret: str) -> bool:
+# Characters of the data URI read per write
+ATTACHMENT_CHUNK_SIZE = 64 * 1024
+# Anything outside the base64 alphabet (e.g. MIME line breaks) is skipped, as b64decode does
+NON_BASE64_PATTERN = re.compile(r'[^A-Za-z0-9+/=]')
+
+def iter_base64_chunks(data: str, chunk_size: int = ATTACHMENT_CHUNK_SIZE):
+    """Decode base64 text in chunks, carrying partial 4-character groups forward"""
+    pending = ''
+    for start in range(0, len(data), chunk_size):
+        pending += NON_BASE64_PATTERN.sub('', data[start:start + chunk_size])
+        usable = len(pending) - len(pending) % 4
+        if usable:
+            yield binascii.a2b_base64(pending[:usable])
+            pending = pending[usable:]
+    if pending:
+        yield binascii.a2b_base64(pending)
+
+async def verify_secret(email: str, secret: str) -> bool:
     """Verify student secret (simplified - use proper auth in production)"""
     # In production, this should check against a database
-    expected_secret = SECRET_STORE.get(email)
-    if expected_secret is None:
-        # Store the first secret received
-        SECRET_STORE[email] = secret
-        return True
-    return expected_secret == secret
+    expected_hash = SECRET_STORE.get(email)
+    if expected_hash is None:
+        # Store a hash of the first secret received
+        hashed = await asyncio.to_thread(
+            bcrypt.hashpw, secret.encode(), bcrypt.gensalt(rounds=BCRYPT_ROUNDS)
+        )
+        # Another request may have registered this email while we were hashing
+        expected_hash = SECRET_STORE.setdefault(email, hashed)
+        if expected_hash is hashed:
+            return True
+    # bcrypt is CPU-bound and compares in constant time
+    return await asyncio.to_thread(bcrypt.checkpw, secret.encode(), expected_hash)
 
-def save_attachments(attachments: List[Attachment]) -> List[str]:
+async def save_attachments(attachments: List[Attachment]) -> List[str]:
     """Save attachments to temporary files and return file paths"""
     saved_paths = []
     
     for attachment in attachments:
+        temp_path = None
         try:
             # Parse data URL
             if attachment.url.startswith('data:'):
                 header, data = attachment.url.split(',', 1)
                 mime_type = header.split(';')[0].split(':')[1]
                 
-                # Decode base64 data
-                file_data = base64.b64decode(data)
-                
-                # Save to temporary file
+                # Decode base64 data in chunks straight into a temporary file
                 file_ext = mime_type.split('/')[-1]
-                temp_file = tempfile.NamedTemporaryFile(
-                    delete=False, 
+                async with aiofiles.tempfile.NamedTemporaryFile(
+                    'wb',
+                    delete=False,
                     suffix=f'.{file_ext}',
                     prefix=attachment.name
-                )
-                temp_file.write(file_data)
-                temp_file.close()
+                ) as temp_file:
+                    temp_path = temp_file.name
+                    for decoded in iter_base64_chunks(data):
+                        await temp_file.write(decoded)
                 
-                saved_paths.append(temp_file.name)
+                saved_paths.append(temp_path)
                 logger.info(f"Saved attachment: {attachment.name}")
                 
         except Exception as e:
             logger.error(f"Error saving attachment {attachment.name}: {str(e)}")
+            # Don't leave a partially written file behind
+            if temp_path:
+                try:
+                    os.remove(temp_path)
+                except OSError:
+                    pass
     
     return saved_paths
 
 def generate_task_id(brief: str) -> str:
     """Generate a unique task ID based on brief"""
-    brief_hash = str(hash(brief))[:8]
+    # xxh3 is stable across processes, unlike the PYTHONHASHSEED-salted hash()
+    brief_hash = xxhash.xxh3_64_hexdigest(brief.encode())[:8]
     return f"task-{brief_hash}-{uuid.uuid4().hex[:4]}"
\ No newline at end of file